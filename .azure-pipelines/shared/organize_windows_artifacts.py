@@ -2,6 +2,7 @@
 # Copyright (c) 2019-2024, The Khronos Group Inc.
 # SPDX-License-Identifier: Apache-2.0
 
+from concurrent.futures import ThreadPoolExecutor
 from itertools import product
 from pathlib import Path
 import shutil
@@ -25,6 +26,7 @@ if __name__ == "__main__":
     outbase = Path(sys.argv[2])
 
     common_copied = False
+    copies = []
 
     for platform, uwp in product(PLATFORMS, TRUE_FALSE):
         # ARM/ARM64 is only built for the UWP platform.
@@ -44,5 +46,11 @@ if __name__ == "__main__":
             common_copied = True
             continue
 
-        # lib files
-        shutil.copytree(artifact / platform_dirname, outbase / platform_dirname, dirs_exist_ok=True)
+        # lib files - each platform directory is distinct, so these can proceed concurrently.
+        copies.append((artifact / platform_dirname, outbase / platform_dirname))
+
+    with ThreadPoolExecutor() as executor:
+        futures = [executor.submit(shutil.copytree, src, dest, dirs_exist_ok=True)
+                   for src, dest in copies]
+        for future in futures:
+            future.result()
@@ -11,15 +11,16 @@ from pathlib import Path
 
 def check_stamp(fn, args):
     new_contents = ",".join(str(x) for x in args).strip()
+    new_bytes = new_contents.encode('utf-8')
     write_stamp = True
     p = Path(fn)
     if p.exists():
-        with open(fn, 'r', encoding='utf-8') as fp:
-            stamp_contents = fp.read().strip()
-            if stamp_contents == new_contents:
-                write_stamp = False
-            else:
-                print("Build configuration options have changed - forcing clean_generated")
+        # We always write the stamp without surrounding whitespace, so a size
+        # mismatch means the contents changed and we can skip reading it.
+        if p.stat().st_size == len(new_bytes) and p.read_bytes().strip() == new_bytes:
+            write_stamp = False
+        else:
+            print("Build configuration options have changed - forcing clean_generated")
 
     if write_stamp:
         with open(fn, 'w', encoding='utf-8') as fp:
@@ -9,16 +9,26 @@
 # avoiding license incompatibility
 
 import re
-from typing import Optional
+from typing import Dict, FrozenSet, Optional
 
 from generator import OutputGenerator, write
 from jinja_helpers import JinjaTemplate, make_jinja_environment
 from spec_tools.util import getElemName, getElemType
 
+# Used to turn a CamelCase enum group name into an UPPER_SNAKE_CASE prefix
+_CAMEL_CASE_BOUNDARY_RE = re.compile(r'([0-9a-z_])([A-Z0-9][^A-Z0-9]?)')
+# Matches a trailing author/vendor tag on an enum group name
+_AUTHOR_SUFFIX_RE = re.compile(r'[A-Z][A-Z]+$')
+
+# Type categories that are generated using genStruct
+_STRUCT_CATEGORIES = frozenset(('struct', 'union'))
+
 
 class PolymorphicStructCollection:
     """Holds struct types that share a parentstruct"""
 
+    __slots__ = ('parent_type_name', 'unprotected_structs', 'protect_sets_and_protected_structs')
+
     def __init__(self, parent_type_name, unprotected_structs, protect_sets_and_protected_structs):
         self.parent_type_name = parent_type_name
         self.unprotected_structs = unprotected_structs
@@ -28,6 +38,8 @@ class PolymorphicStructCollection:
 class CommandData:
     """Represents a OpenXR command"""
 
+    __slots__ = ('commandName', 'featureName')
+
     def __init__(self, commandName, featureName):
         self.commandName = commandName
         self.featureName = featureName
@@ -35,27 +47,30 @@ class CommandData:
 class StructData:
     """Represents a OpenXR struct type"""
 
+    __slots__ = ('typeName', 'members', 'structTypeName', 'protect', 'protect_value', 'protect_string')
+
     def __init__(self, typeName, structTypeName, members, protect):
         self.typeName = typeName
-        self.members = members
+        # Never modified once collected
+        self.members = tuple(members)
         self.structTypeName = structTypeName
         self.protect = protect
 
-    @property
-    def protect_value(self) -> bool:
-        """Whether the struct has preprocessor macro protection"""
-        return self.protect is not None
+        # Whether the struct has preprocessor macro protection
+        self.protect_value: bool = protect is not None
 
-    @property
-    def protect_string(self) -> Optional[str]:
-        """The preprocessor expression to test for protection, or None"""
-        if self.protect:
-            return " && ".join(f"defined({x})" for x in self.protect)
+        # The preprocessor expression to test for protection, or None.
+        # Computed once here since templates use it for both #if and #endif.
+        self.protect_string: Optional[str] = None
+        if protect:
+            self.protect_string = " && ".join(f"defined({x})" for x in protect)
 
 
 class BitmaskData:
     """Represents a OpenXR mask type"""
 
+    __slots__ = ('typeName', 'maskTuples')
+
     def __init__(self, typeName, maskTuples):
         self.typeName = typeName
         self.maskTuples = maskTuples
@@ -64,6 +79,8 @@ class BitmaskData:
 class EnumData:
     """Represents a OpenXR group enum type"""
 
+    __slots__ = ('typeName', 'typeNamePrefix', 'typeNameSuffix', 'enumTuples')
+
     def __init__(self, typeName, typeNamePrefix, typeNameSuffix, enumTuples):
         self.typeName = typeName
         self.typeNamePrefix = typeNamePrefix
@@ -81,47 +98,57 @@ class CReflectionOutputGenerator(OutputGenerator):
         self.commands = []
         self.enums = []
         self.bitmasks = []
-        self.protects = set()
         self.template: Optional[JinjaTemplate] = None
         self.parents = {}
+        # Split form of each featureExtraProtect value seen so far
+        self.feature_protect_cache: Dict[str, FrozenSet[str]] = {}
 
     def beginFile(self, genOpts):
         OutputGenerator.beginFile(self, genOpts)
         self.template = JinjaTemplate(self.env, f"template_{genOpts.filename}")
 
-    def _get_structs_for_protect(self, protect=None):
-        """
-        Get an array of structure objects available only with the given protects defined.
-        """
-        ret = [x for x in self.structs
-               if x.protect == protect and x.structTypeName is not None]
-        return ret
-
     def endFile(self):
         assert self.template
         assert self.registry
-        file_data = ''
-
-        unprotected_structs = self._get_structs_for_protect()
-        protected_structs = [(x, self._get_structs_for_protect(protect=x))
-                             for x in sorted(self.protects)]
-        # drop empty collections
-        protected_structs = [(x, y) for x, y in protected_structs if y]
-
-        polymorphic_struct_families = []
-        for parent_name, child_names in self.parents.items():
-            # filter by name
-            prot = [
-                (protect, [s for s in structs if s.typeName in child_names])
-                for protect, structs in protected_structs
-            ]
-            # filter out empty protection groups
-            prot = [(protect, structs) for protect, structs in prot if structs]
-
-            polymorphic_struct_families.append(PolymorphicStructCollection(
+
+        # Bucket the structure objects by the protects they require, in one pass
+        structs_by_protect = {}
+        for x in self.structs:
+            if x.structTypeName is not None:
+                structs_by_protect.setdefault(x.protect, []).append(x)
+
+        unprotected_structs = structs_by_protect.pop(None, [])
+        # Every bucket is non-empty, so there are no empty collections to drop
+        protected_structs = sorted(structs_by_protect.items())
+
+        # Each child struct has a single parent, so sort the structs into their
+        # families with one pass over each list, keeping their original order.
+        parent_of = {child_name: parent_name
+                     for parent_name, child_names in self.parents.items()
+                     for child_name in child_names}
+        unprotected_children = {parent_name: [] for parent_name in self.parents}
+        protected_children = {parent_name: [] for parent_name in self.parents}
+        for s in unprotected_structs:
+            parent_name = parent_of.get(s.typeName)
+            if parent_name is not None:
+                unprotected_children[parent_name].append(s)
+        for protect, structs in protected_structs:
+            children_by_parent = {}
+            for s in structs:
+                parent_name = parent_of.get(s.typeName)
+                if parent_name is not None:
+                    children_by_parent.setdefault(parent_name, []).append(s)
+            # only non-empty protection groups end up here
+            for parent_name, children in children_by_parent.items():
+                protected_children[parent_name].append((protect, children))
+
+        polymorphic_struct_families = [
+            PolymorphicStructCollection(
                 parent_name,
-                unprotected_structs=[s for s in unprotected_structs if s.typeName in child_names],
-                protect_sets_and_protected_structs=prot))
+                unprotected_structs=unprotected_children[parent_name],
+                protect_sets_and_protected_structs=protected_children[parent_name])
+            for parent_name in self.parents
+        ]
 
         extensions = list(
             ((name, data) for name, data in self.registry.extdict.items()
@@ -134,7 +161,7 @@ class CReflectionOutputGenerator(OutputGenerator):
             functions_by_feature[x.featureName].append((x.commandName, x.featureName))
 
         extensions.sort(key=lambda x: int(x[1].number))
-        file_data += self.template.render(
+        stream = self.template.stream(
             unprotectedStructs=unprotected_structs,
             protectedStructs=protected_structs,
             structs=self.structs,
@@ -143,7 +170,11 @@ class CReflectionOutputGenerator(OutputGenerator):
             extensions=extensions,
             polymorphic_struct_families=polymorphic_struct_families,
             functions_by_feature=functions_by_feature)
-        write(file_data, file=self.outFile)
+        # Join many rendered pieces per write, rather than Jinja's default of five
+        stream.enable_buffering(size=1024)
+        stream.dump(self.outFile)
+        # Terminate the template output with a newline
+        write('', file=self.outFile)
 
         # Finish processing in superclass
         OutputGenerator.endFile(self)
@@ -155,16 +186,17 @@ class CReflectionOutputGenerator(OutputGenerator):
         if alias:
             return
         category = typeElem.get('category')
-        if category in ('struct', 'union'):
+        if category is None:
+            # Only structure types carry a parentstruct
+            return
+        if category in _STRUCT_CATEGORIES:
             # If the type is a struct type, generate it using the
             # special-purpose generator.
             self.genStruct(typeinfo, name, alias)
 
         parent_struct = typeElem.get('parentstruct')
         if parent_struct is not None:
-            if parent_struct not in self.parents:
-                self.parents[parent_struct] = set()
-            self.parents[parent_struct].add(name)
+            self.parents.setdefault(parent_struct, []).append(name)
 
     def genCmd(self, cmdinfo, name, alias):
         OutputGenerator.genCmd(self, cmdinfo, name, alias)
@@ -180,19 +212,29 @@ class CReflectionOutputGenerator(OutputGenerator):
         if alias:
             return
 
+        # Local names for everything called once per member
+        get_name = getElemName
+        get_type = getElemType
+        is_structure_type_member = self.conventions.is_structure_type_member
         structTypeEnum = None
         members = []
+        add_member = members.append
         for member in typeinfo.getMembers():
-            memberName = getElemName(member)
-            memberType = getElemType(member)
-            if self.conventions.is_structure_type_member(memberType, memberName):
+            memberName = get_name(member)
+            memberType = get_type(member)
+            if is_structure_type_member(memberType, memberName):
                 structTypeEnum = member.get("values")
 
-            members.append(memberName)
+            add_member(memberName)
 
         protect = set()
-        if self.featureExtraProtect:
-            protect.update(self.featureExtraProtect.split(','))
+        featureExtraProtect = self.featureExtraProtect
+        if featureExtraProtect:
+            featureProtect = self.feature_protect_cache.get(featureExtraProtect)
+            if featureProtect is None:
+                featureProtect = frozenset(featureExtraProtect.split(','))
+                self.feature_protect_cache[featureExtraProtect] = featureProtect
+            protect.update(featureProtect)
         localProtect = typeinfo.elem.get('protect')
         if localProtect:
             protect.update(localProtect.split(','))
@@ -203,8 +245,6 @@ class CReflectionOutputGenerator(OutputGenerator):
             protect = None
 
         self.structs.append(StructData(typeName, structTypeEnum, members, protect))
-        if protect:
-            self.protects.add(protect)
 
     def genGroup(self, groupinfo, groupName, alias=None):
         OutputGenerator.genGroup(self, groupinfo, groupName, alias)
@@ -215,28 +255,30 @@ class CReflectionOutputGenerator(OutputGenerator):
         if getElemType(groupinfo.elem) == 'bitmask':
             bitmaskTypeName = getElemName(groupinfo.flagType.elem)
 
-            bitmaskTuples = []
-            for elem in groupinfo.elem.findall('enum'):
-                (numVal, strVal) = self.enumToValue(elem, True)
-                bitmaskTuples.append((getElemName(elem), strVal))
+            enumToValue = self.enumToValue
+            bitmaskTuples = [(getElemName(elem), enumToValue(elem, True)[1])
+                             for elem in groupinfo.elem if elem.tag == 'enum']
 
             self.bitmasks.append(BitmaskData(bitmaskTypeName, bitmaskTuples))
         else:
             groupElem = groupinfo.elem
 
-            expandName = re.sub(r'([0-9a-z_])([A-Z0-9][^A-Z0-9]?)', r'\1_\2', groupName).upper()
+            expandName = _CAMEL_CASE_BOUNDARY_RE.sub(r'\1_\2', groupName).upper()
             expandPrefix = expandName
 
             expandSuffix = ''
-            expandSuffixMatch = re.search(r'[A-Z][A-Z]+$', groupName)
+            expandSuffixMatch = _AUTHOR_SUFFIX_RE.search(groupName)
             if expandSuffixMatch:
                 expandSuffix = f"_{expandSuffixMatch.group()}"
                 # Strip off the suffix from the prefix
                 expandPrefix = expandName.rsplit(expandSuffix, 1)[0]
 
+            enumToValue = self.enumToValue
             enumTuples = []
-            for elem in groupElem.findall('enum'):
-                (numVal, strVal) = self.enumToValue(elem, True)
+            for elem in groupElem:
+                if elem.tag != 'enum':
+                    continue
+                (numVal, strVal) = enumToValue(elem, True)
                 if numVal is None:
                     # then this is an alias or something
                     continue
@@ -4,12 +4,11 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional
-from dataclasses import dataclass
 
-from generator import GeneratorOptions, OutputGenerator, noneStr, write
-from parse_dependency import dependencyLanguageComment
+from generator import GeneratorOptions, OutputGenerator, noneStr
 
 _ENUM_TABLE_PREFIX = """
 [cols=",",options="header",]
@@ -26,21 +25,48 @@ _FLAG_BLOCK_PREFIX = """.Flag Descriptions
 
 _BLOCK_SUFFIX = """****"""
 
+# The same dependency expressions recur for many APIs, so memoize their
+# translation for genRequirements.
+@lru_cache(maxsize=None)
+def _dependencyLanguageComment(dependency):
+    # parse_dependency pulls in pyparsing, which is only needed when
+    # requirements are generated, so import it on first use.
+    from parse_dependency import dependencyLanguageComment
+    return dependencyLanguageComment(dependency)
+
 
-@dataclass
 class _Enumerant:
-    name: str
-    value: int
-    comment: str
-    extname: Optional[str] = None
-    deprecated: Optional[str] = None
-    alias: Optional[str] = None
+    """An enumerant value to list in an enum table or box."""
 
+    __slots__ = ('name', 'value', 'comment', 'extname', 'deprecated', 'alias',
+                 'ext_note', 'deprecated_note')
 
+    def __init__(self,
+                 name: str,
+                 value: int,
+                 comment: str,
+                 extname: Optional[str] = None,
+                 deprecated: Optional[str] = None,
+                 alias: Optional[str] = None):
+        self.name = name
+        self.value = value
+        self.comment = comment
+        self.extname = extname
+        self.deprecated = deprecated
+        self.alias = alias
+        # Formatted notes, computed once when the enumerant is collected and
+        # shared by the table and box writers.
+        self.ext_note: Optional[str] = None
+        self.deprecated_note = ""
+
+
+@lru_cache(maxsize=None)
 def orgLevelKey(name):
     # Sort key for organization levels of features / extensions
     # From highest to lowest, core versions, KHR extensions, EXT extensions,
     # and vendor extensions
+    # The set of feature / extension names is small and heavily reused
+    # across genRequirements calls, so the result is memoized.
 
     prefixes = (
         'VK_VERSION_',
@@ -56,15 +82,18 @@ def orgLevelKey(name):
     return len(prefixes)
 
 
-def _deprecated_enum_note(data: _Enumerant):
-    if data.deprecated == "true":
-        return "_(deprecated)_ "
-    if data.deprecated == "ignored":
-        return "__(deprecated -- ignored)__ "
-    if data.deprecated is None:
-        return ""
+_DEPRECATED_ENUM_NOTES = {
+    "true": "_(deprecated)_ ",
+    "ignored": "__(deprecated -- ignored)__ ",
+    None: "",
+}
+
 
-    raise RuntimeWarning("Unhandled 'deprecated' attribute for an enumerant value")
+def _deprecated_enum_note(data: _Enumerant):
+    try:
+        return _DEPRECATED_ENUM_NOTES[data.deprecated]
+    except KeyError:
+        raise RuntimeWarning("Unhandled 'deprecated' attribute for an enumerant value")
 
 
 class DocGeneratorOptions(GeneratorOptions):
@@ -183,6 +212,18 @@ class DocOutputGenerator(OutputGenerator):
         # inferred type name pattern for different APIs.
         self.result_type = f"{genOpts.conventions.type_prefix}Result"
 
+        # Name prefixes and the index term suffix used for each, in order
+        conventions = genOpts.conventions
+        self.index_term_rules = (
+            (conventions.command_prefix, " (function)"),
+            (conventions.type_prefix, " (type)"),
+            (conventions.api_prefix, " (define)"),
+        )
+
+        # Subdirectories of the output directory, created on first use
+        self.directory = Path(genOpts.directory)
+        self.subdirectories = {}
+
     def endFile(self):
         OutputGenerator.endFile(self)
 
@@ -222,16 +263,17 @@ class DocOutputGenerator(OutputGenerator):
                         # names, in which case the sorting will not work well.
 
                         # First, convert it from asciidoctor markup to language.
-                        depLanguage = dependencyLanguageComment(dependency)
+                        depLanguage = _dependencyLanguageComment(dependency)
 
                         # If they are the same, the dependency is only a
                         # single extension, and sorting them works.
                         # Otherwise, skip it.
                         if depLanguage == dependency:
-                            deps = sorted(
-                                    sorted((base, dependency)),
-                                    key=orgLevelKey)
-                            depString = ' with '.join(deps)
+                            # Order by organization level, then by name
+                            if (orgLevelKey(base), base) <= (orgLevelKey(dependency), dependency):
+                                depString = f'{base} with {dependency}'
+                            else:
+                                depString = f'{dependency} with {base}'
                         else:
                             # An expression with multiple extensions
                             depString = f'{base} with {depLanguage}'
@@ -254,94 +296,96 @@ class DocOutputGenerator(OutputGenerator):
             # No API dictionary available, return nothing
             return ''
 
+    def getSubdirectory(self, name):
+        """Return the Path of an output subdirectory, creating it if needed.
+
+        - name - subdirectory name, relative to the output directory"""
+        directory = self.subdirectories.get(name)
+        if directory is None:
+            directory = self.directory / name
+            self.makeDir(directory)
+            self.subdirectories[name] = directory
+        return directory
+
     def writeInclude(self, directory, basename, contents):
         """Generate an include file.
 
         - directory - subdirectory to put file in
         - basename - base name of the file
         - contents - contents of the file (Asciidoc boilerplate aside)"""
+        genOpts = self.genOpts
+        assert genOpts
+        conventions = genOpts.conventions
+
         # Create subdirectory, if needed
-        assert self.genOpts
-        directory = Path(self.genOpts.directory) / directory
-        self.makeDir(directory)
+        directory = self.getSubdirectory(directory)
 
         # Create file
         filename = directory / f"{basename}{self.file_suffix}"
-        self.logMsg('diag', '# Generating include file:', str(filename))
-        fp = open(filename, 'w', encoding='utf-8')
+        self.logMsg('diag', '# Generating include file:', filename)
+
+        # The source block is shared with the secondary include file
+        source_block = '\n'.join((
+            f'[source,{conventions.docgen_language}]',
+            '----',
+            contents,
+            '----'))
 
         # Asciidoc anchor
-        write(self.genOpts.conventions.warning_comment, file=fp)
-        write(f'[[{basename}]]', file=fp)
-
-        if self.genOpts.conventions.generate_index_terms:
-            if basename.startswith(self.conventions.command_prefix):
-                index_term = f"{basename} (function)"
-            elif basename.startswith(self.conventions.type_prefix):
-                index_term = f"{basename} (type)"
-            elif basename.startswith(self.conventions.api_prefix):
-                index_term = f"{basename} (define)"
+        lines = [
+            conventions.warning_comment,
+            f'[[{basename}]]',
+        ]
+
+        if conventions.generate_index_terms:
+            for prefix, suffix in self.index_term_rules:
+                if basename.startswith(prefix):
+                    index_term = basename + suffix
+                    break
             else:
                 index_term = basename
-            write(f'indexterm:[{index_term}]', file=fp)
+            lines.append(f'indexterm:[{index_term}]')
 
-        write(f'[source,{self.conventions.docgen_language}]', file=fp)
-        write('----', file=fp)
-        write(contents, file=fp)
-        write('----', file=fp)
-        fp.close()
+        lines.append(source_block)
+        filename.write_text('\n'.join(lines) + '\n', encoding='utf-8')
 
-        if self.genOpts.secondaryInclude:
+        if genOpts.secondaryInclude:
             # Create secondary no cross-reference include file
             filename = directory / f'{basename}.no-xref{self.file_suffix}'
             self.logMsg('diag', '# Generating include file:', filename)
-            fp = open(filename, 'w', encoding='utf-8')
-
-            # Asciidoc anchor
-            write(self.genOpts.conventions.warning_comment, file=fp)
-            write('// Include this no-xref version without cross reference id for multiple includes of same file', file=fp)
-            write(f'[source,{self.conventions.docgen_language}]', file=fp)
-            write('----', file=fp)
-            write(contents, file=fp)
-            write('----', file=fp)
-            fp.close()
+            lines = [
+                conventions.warning_comment,
+                '// Include this no-xref version without cross reference id for multiple includes of same file',
+                source_block,
+            ]
+            filename.write_text('\n'.join(lines) + '\n', encoding='utf-8')
 
     def writeEnumTable(self, basename, values):
         """Output a table of enumerants."""
         assert self.genOpts
-        directory = Path(self.genOpts.directory) / 'enums'
-        self.makeDir(directory)
+        directory = self.getSubdirectory('enums')
 
         filename = directory / f"{basename}.comments{self.file_suffix}"
         self.logMsg('diag', '# Generating include file:', filename)
 
-        with open(filename, 'w', encoding='utf-8') as fp:
-            write(self.conventions.warning_comment, file=fp)
-            write(_ENUM_TABLE_PREFIX, file=fp)
-
-            for data in values:
-                write(self._make_enumerant_table_row(data), file=fp)
-
-            write(_TABLE_SUFFIX, file=fp)
+        lines = [self.conventions.warning_comment, _ENUM_TABLE_PREFIX]
+        lines.extend(self._make_enumerant_table_row(data) for data in values)
+        lines.append(_TABLE_SUFFIX)
+        filename.write_text('\n'.join(lines) + '\n', encoding='utf-8')
 
     def writeBox(self, filename, prefix, items):
         """Write a generalized block/box for some values."""
         self.logMsg('diag', '# Generating include file:', filename)
 
-        with open(filename, 'w', encoding='utf-8') as fp:
-            write(self.conventions.warning_comment, file=fp)
-            write(prefix, file=fp)
-
-            for item in items:
-                write(f"* {item}", file=fp)
-
-            write(_BLOCK_SUFFIX, file=fp)
+        lines = [self.conventions.warning_comment, prefix]
+        lines.extend(f"* {item}" for item in items)
+        lines.append(_BLOCK_SUFFIX)
+        filename.write_text('\n'.join(lines) + '\n', encoding='utf-8')
 
     def writeEnumBox(self, basename, values):
         """Output a box of enumerants."""
         assert self.genOpts
-        directory = Path(self.genOpts.directory) / 'enums'
-        self.makeDir(directory)
+        directory = self.getSubdirectory('enums')
 
         filename = directory / f'{basename}.comments-box{self.file_suffix}'
         self.writeBox(
@@ -356,8 +400,7 @@ class DocOutputGenerator(OutputGenerator):
     def writeFlagBox(self, basename, values):
         """Output a box of flag bit comments."""
         assert self.genOpts
-        directory = Path(self.genOpts.directory) / 'enums'
-        self.makeDir(directory)
+        directory = self.getSubdirectory('enums')
 
         filename = directory / f'{basename}.comments{self.file_suffix}'
         self.writeBox(
@@ -384,7 +427,7 @@ class DocOutputGenerator(OutputGenerator):
             self.genStruct(typeinfo, name, alias)
         elif category not in OutputGenerator.categoryToPath:
             # If there is no path, do not write output
-            self.logMsg('diag', f'NOT writing include for {name} category {category}')
+            self.logMsg('diag', 'NOT writing include for', name, 'category', category)
         else:
             body = self.genRequirements(name)
             if alias:
@@ -399,13 +442,15 @@ class DocOutputGenerator(OutputGenerator):
                 text = noneStr(typeElem.text)
                 if category in ('define',):
                     text = text.lstrip()
-                body += text
+                parts = [body, text]
 
                 for elem in typeElem:
                     if elem.tag == 'apientry':
-                        body += self.genOpts.apientry + noneStr(elem.tail)
+                        parts.append(self.genOpts.apientry)
                     else:
-                        body += noneStr(elem.text) + noneStr(elem.tail)
+                        parts.append(noneStr(elem.text))
+                    parts.append(noneStr(elem.tail))
+                body = ''.join(parts)
 
                 if body:
                     self.writeInclude(OutputGenerator.categoryToPath[category],
@@ -420,14 +465,14 @@ class DocOutputGenerator(OutputGenerator):
         Factored out to allow aliased types to also generate the original type.
         """
         typeElem = typeinfo.elem
-        body = f"typedef {typeElem.get('category')} {typeName} {{\n"
+        parts = [f"typedef {typeElem.get('category')} {typeName} {{\n"]
 
         targetLen = self.getMaxCParamTypeLength(typeinfo)
-        for member in typeElem.findall('.//member'):
-            body += self.makeCParamDecl(member, targetLen + 4)
-            body += ';\n'
-        body += f"}} {typeName};"
-        return body
+        for member in typeElem.iterfind('.//member'):
+            parts.append(self.makeCParamDecl(member, targetLen + 4))
+            parts.append(';\n')
+        parts.append(f"}} {typeName};")
+        return ''.join(parts)
 
     def genStruct(self, typeinfo, typeName, alias):
         """Generate struct."""
@@ -448,50 +493,6 @@ class DocOutputGenerator(OutputGenerator):
 
         self.writeInclude('structs', typeName, body)
 
-    def _maybe_return_enumerant_object_for_table(
-        self, elems, elem, missing_comments: List[str]
-    ) -> Optional[_Enumerant]:
-        assert self.genOpts
-        if not elem.get("required"):
-            return
-        name = elem.get("name")
-
-        (num_val, _) = self.enumToValue(elem, True, parent_for_alias_dereference=elems)
-
-        extname = elem.get("extname")
-
-        added_by_extension_to_core = extname is not None and self.in_core
-        if added_by_extension_to_core and not self.genOpts.extEnumerantAdditions:
-            # We are skipping such values
-            return
-
-        comment = elem.get("comment")
-        alias = elem.get("alias")
-        if comment is None:
-            if name.endswith("_UNKNOWN") and num_val == 0:
-                # This is a placeholder for 0-initialization to be clearly invalid.
-                # Just skip this silently
-                return
-            if alias is not None:
-                # oh it's an alias. That's fine. We can generate a comment.
-                comment = f"Alias for ename:{alias}"
-
-            else:
-                # Skip but record this in case it is an odd-one-out missing
-                # a comment.
-                missing_comments.append(name)
-                return
-
-        assert num_val is not None
-
-        return _Enumerant(
-            name=name,
-            value=num_val,
-            comment=comment,
-            extname=extname,
-            deprecated=elem.get("deprecated"),
-        )
-
     def _make_enumerant_extension_note(self, data: _Enumerant) -> Optional[str]:
         assert self.genOpts
         if data.extname is not None and self.genOpts.extEnumerantFormatString:
@@ -499,30 +500,20 @@ class DocOutputGenerator(OutputGenerator):
             return self.genOpts.extEnumerantFormatString.format(formatted_ext)
 
     def _make_enumerant_list_item(self, data: _Enumerant) -> str:
-        ext_note = self._make_enumerant_extension_note(data)
-        parts = [
-            f"ename:{data.name}",
-            _deprecated_enum_note(data),
-            "--",
-            data.comment,
-            ext_note,
-        ]
+        item = f"ename:{data.name} {data.deprecated_note} -- {data.comment}"
 
-        # Filter out None values before joining to avoid excess space
-        return " ".join(part for part in parts if part is not None)
+        # Only append the extension note if there is one, to avoid excess space
+        if data.ext_note is not None:
+            return f"{item} {data.ext_note}"
+        return item
 
     def _make_enumerant_table_row(self, data: _Enumerant) -> str:
-        ext_note = self._make_enumerant_extension_note(data)
-        parts = [
-            f"|ename:{data.name}",
-            "|",
-            _deprecated_enum_note(data),
-            data.comment,
-            ext_note,
-        ]
+        row = f"|ename:{data.name} | {data.deprecated_note} {data.comment}"
 
-        # Filter out None values before joining to avoid excess space
-        return " ".join(part for part in parts if part is not None)
+        # Only append the extension note if there is one, to avoid excess space
+        if data.ext_note is not None:
+            return f"{row} {data.ext_note}"
+        return row
 
     def genEnumTable(self, groupinfo, groupName):
         """Generate tables of enumerant values and short descriptions from
@@ -530,12 +521,56 @@ class DocOutputGenerator(OutputGenerator):
 
         assert self.genOpts
 
+        groupElem = groupinfo.elem
+        # Values added to a core type by extensions are skipped unless
+        # extEnumerantAdditions is set
+        skip_extension_values = self.in_core and not self.genOpts.extEnumerantAdditions
+        enumToValue = self.enumToValue
+        make_extension_note = self._make_enumerant_extension_note
+
         values = []
         missing_comments = []
-        for elem in groupinfo.elem.findall("enum"):
-            maybe_data = self._maybe_return_enumerant_object_for_table(groupinfo.elem, elem, missing_comments)
-            if maybe_data:
-                values.append(maybe_data)
+        for elem in groupElem.iterfind("enum"):
+            get = elem.get
+            if not get("required"):
+                continue
+            name = get("name")
+
+            (num_val, _) = enumToValue(elem, True, parent_for_alias_dereference=groupElem)
+
+            extname = get("extname")
+            if extname is not None and skip_extension_values:
+                continue
+
+            comment = get("comment")
+            if comment is None:
+                if name.endswith("_UNKNOWN") and num_val == 0:
+                    # This is a placeholder for 0-initialization to be clearly invalid.
+                    # Just skip this silently
+                    continue
+                alias = get("alias")
+                if alias is not None:
+                    # oh it's an alias. That's fine. We can generate a comment.
+                    comment = f"Alias for ename:{alias}"
+
+                else:
+                    # Skip but record this in case it is an odd-one-out missing
+                    # a comment.
+                    missing_comments.append(name)
+                    continue
+
+            assert num_val is not None
+
+            data = _Enumerant(
+                name=name,
+                value=num_val,
+                comment=comment,
+                extname=extname,
+                deprecated=get("deprecated"),
+            )
+            data.ext_note = make_extension_note(data)
+            data.deprecated_note = _deprecated_enum_note(data)
+            values.append(data)
 
         if values and any(v.alias is None for v in values):
             # If any had a (non-alias) comment, output it.
@@ -552,13 +587,13 @@ class DocOutputGenerator(OutputGenerator):
 
             group_type = groupinfo.elem.get('type')
             if groupName == self.result_type:
-                # Split this into success and failure
-                self.writeEnumTable(f"{groupName}.success",
-                                    (data for data in values
-                                     if data.value >= 0))
-                self.writeEnumTable(f"{groupName}.error",
-                                    (data for data in values
-                                     if data.value < 0))
+                # Split this into success and failure, in a single pass
+                success = []
+                error = []
+                for data in values:
+                    (success if data.value >= 0 else error).append(data)
+                self.writeEnumTable(f"{groupName}.success", success)
+                self.writeEnumTable(f"{groupName}.error", error)
             elif group_type == 'bitmask':
                 self.writeFlagBox(groupName, values)
             elif group_type == 'enum':
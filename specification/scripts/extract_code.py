@@ -12,18 +12,48 @@
 
 import argparse
 import errno
+import io
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 from enum import Enum, unique
 from pathlib import Path
 
 from spec_tools.file_process import LinewiseFileProcessor
 
 ROOT = Path(__file__).resolve().parent.parent.parent
-ALL_DOCS = sorted((ROOT / 'specification/sources/').glob('**/*.adoc'))
+SOURCEDIR = ROOT / 'specification/sources'
+
+# Messages and the makefile use paths relative to the working directory
+CWD = Path('.').resolve()
 
 CODEDIR = ROOT / 'specification/example-builds'
 GENCODEDIR = CODEDIR / 'generated'
 
+# Attribute line introducing a source block, e.g. [source,c++]
+BLOCK_PATTERN = re.compile(r'\[source(,?)(?P<tags>.*)\]')
+
+# Start of a line that opens or closes a block
+DELIMITER_PATTERN = re.compile(r'^---', re.MULTILINE)
+
+
+def _walk_adoc_files(directory):
+    """Yield the path strings of all .adoc files below directory."""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk_adoc_files(entry.path)
+            elif entry.name.endswith('.adoc'):
+                yield entry.path
+
+
+def find_all_docs():
+    """Return a sorted list of the Paths of all chapters and extensions."""
+    if not SOURCEDIR.is_dir():
+        return []
+    return sorted(Path(path) for path in _walk_adoc_files(SOURCEDIR))
+
 
 @unique
 class Language(Enum):
@@ -41,20 +71,33 @@ class Language(Enum):
 
     @property
     def extension(self):
-        if self == Language.UNKNOWN:
+        try:
+            return LANGUAGE_EXTENSIONS[self]
+        except KeyError:
             raise RuntimeError(
                 "Can't get extension for UNKNOWN language")
-        if self == Language.ASCIIDOC:
-            return 'adoc'
-        return str(self).lower().replace('+', 'p')
 
     @classmethod
     def from_string(cls, s):
-        s = s.upper()
-        for val in Language:
-            if s == str(val).upper():
-                return val
-        return Language.UNKNOWN
+        return LANGUAGES_BY_NAME.get(s.upper(), Language.UNKNOWN)
+
+
+# key: upper-case language name, as found in source block tags
+# value: Language, in declaration order
+LANGUAGES_BY_NAME = {str(lang).upper(): lang for lang in Language}
+
+# Languages of the code blocks that are extracted and built
+LANGUAGES_TO_EXTRACT = (Language.C, Language.CPP)
+
+# File extension for each language that has one
+LANGUAGE_EXTENSIONS = {
+    Language.C: 'c',
+    Language.CPP: 'cpp',
+    Language.XML: 'xml',
+    Language.ASCIIDOC: 'adoc',
+    Language.JSON: 'json',
+    Language.SH: 'sh',
+}
 
 
 class CodeExtractor(LinewiseFileProcessor):
@@ -65,10 +108,24 @@ class CodeExtractor(LinewiseFileProcessor):
         self.output_line_numbers = output_line_numbers
         self.quiet = quiet
 
+        # Names in CODEDIR, listed once to look up the optional header
+        # for each snippet without a stat() per snippet.
+        try:
+            self.codedir_names = frozenset(os.listdir(CODEDIR))
+        except FileNotFoundError:
+            self.codedir_names = frozenset()
+
+        self.reset()
+
+    def reset(self):
+        """Clear all per-file state, so this extractor can process another file.
+
+        Results of the previous file are replaced, not modified, so
+        references to them remain valid."""
+        LinewiseFileProcessor.__init__(self)
+
         self.next_snippet_id = 0
         self.in_code_block = False
-        self.block_pattern = re.compile(r'\[source(,?)(?P<tags>.*)\]')
-        self.languages_to_extract = set((Language.CPP, Language.C))
         self.code_lines = None
 
         self.generated_files = []
@@ -100,24 +157,30 @@ class CodeExtractor(LinewiseFileProcessor):
             # No previous line to find language.
             return
 
-        code_block_tag = self.block_pattern.match(prev_line.rstrip())
+        # Most delimiters are not preceded by a source block attribute line,
+        # so check the prefix before running the regex.
+        if not prev_line.startswith('[source'):
+            return
+
+        # The pattern stops at the last ']' on the line, so trailing
+        # whitespace does not need to be stripped first.
+        code_block_tag = BLOCK_PATTERN.match(prev_line)
         if not code_block_tag:
             # Not going to handle this.
             return
 
         tags = set(code_block_tag.group('tags').upper().split(','))
 
-        self.language = Language.UNKNOWN
-        for lang in Language:
-            if str(lang).upper() in tags:
-                self.language = lang
-                break
+        # The first language in declaration order wins, not the first tag
+        self.language = next((lang for name, lang in LANGUAGES_BY_NAME.items()
+                              if name in tags),
+                             Language.UNKNOWN)
         if self.language == Language.UNKNOWN:
             self.print_message('Not extracting code snippet introduced with {} (tags = {})'.format(
                 code_block_tag.group(), tags))
             return
 
-        if self.language not in self.languages_to_extract:
+        if self.language not in LANGUAGES_TO_EXTRACT:
             self.print_message('Not extracting code snippet identified as {}'.format(
                 self.language))
             return
@@ -143,42 +206,82 @@ class CodeExtractor(LinewiseFileProcessor):
 
         out_filename = self.make_numbered_filename(self.language)
         self.print_message('Writing {} extracted lines to file {}\n'.format(
-            len(code_lines), out_filename.relative_to(Path('.').resolve())))
+            len(code_lines), out_filename.relative_to(CWD)))
         self.generated_files.append(out_filename)
 
         self.origins[out_filename] = self.start_of_code_block
 
         include_file = CODEDIR / out_filename.with_suffix('.h').name
 
-        with out_filename.open('w', encoding='utf-8') as f:
-            f.write('#include "common_include.h"\n')
-            if include_file.exists():
-                f.write(f'#include "{include_file.name}"\n\n')
-                self.deps.append((out_filename, include_file))
-            f.write('void func() {\n')
-            f.write(''.join(code_lines))
-            f.write('\n}\n')
-
-    def process_code_block_line(self):
-        if self.code_lines is not None:
-            if self.output_line_numbers:
-                self.code_lines.append(f'# {self.line_number} "{self.filename}\"\n')
-            self.code_lines.append(self.line)
+        parts = ['#include "common_include.h"\n']
+        if include_file.name in self.codedir_names:
+            parts.append(f'#include "{include_file.name}"\n\n')
+            self.deps.append((out_filename, include_file))
+        parts.append('void func() {\n')
+        parts.extend(code_lines)
+        parts.append('\n}\n')
+        out_filename.write_text(''.join(parts), encoding='utf-8')
+
+    def process_delimiter(self):
+        # Toggle code block status.
+        self.in_code_block = not self.in_code_block
+
+        if self.in_code_block:
+            # We just started a code block
+            self.process_start_of_code_block()
+        else:
+            # We just ended one.
+            self.process_end_of_code_block()
 
     def process_line(self, line_num, line):
         if line.startswith('---'):
-            # Toggle code block status.
-            self.in_code_block = not self.in_code_block
+            self.process_delimiter()
+
+        elif self.code_lines is not None:
+            # Only set inside a code block being extracted.
+            if self.output_line_numbers:
+                self.code_lines.append(f'# {line_num} "{self.filename}\"\n')
+            self.code_lines.append(line)
+
+    def process_matched_line(self, line_num, line):
+        # Only delimiters are visited, so take the lines of a block being
+        # extracted all at once when reaching its end.
+        if self.in_code_block and self.code_lines is not None:
+            self.code_lines = self.get_preceding_lines(
+                line_num - self.start_of_code_block - 1)
+        self.process_delimiter()
+
+    def extract(self, filename):
+        """Reset, then process filename with the fastest suitable method."""
+        self.reset()
+        if self.output_line_numbers:
+            # Line number markers need each line visited individually.
+            self.process_file(filename)
+        else:
+            # Otherwise only the delimiter lines need visiting.
+            self.process_file_matches(filename, DELIMITER_PATTERN)
+
+
+# The CodeExtractor of a worker process, reused for each file it is given
+_worker_extractor = None
+
 
-            if self.in_code_block:
-                # We just started a code block
-                self.process_start_of_code_block()
-            else:
-                # We just ended one.
-                self.process_end_of_code_block()
+def _init_worker(output_line_numbers, quiet):
+    global _worker_extractor
+    _worker_extractor = CodeExtractor(output_line_numbers=output_line_numbers,
+                                      quiet=quiet)
 
-        elif self.in_code_block:
-            self.process_code_block_line()
+
+def _extract_file(fn):
+    """Extract code from one file using this process's CodeExtractor.
+
+    Returns the results along with the messages printed, so that the
+    caller can output them in file order."""
+    extractor = _worker_extractor
+    with redirect_stdout(io.StringIO()) as output:
+        extractor.extract(fn)
+    return (extractor.filename, extractor.generated_files, extractor.deps,
+            extractor.origins, output.getvalue())
 
 
 class CodeExtractorGroup(object):
@@ -192,6 +295,13 @@ class CodeExtractorGroup(object):
         # all generated sources files
         self.all_generated = []
 
+        # generated C and C++ source file names, for the makefile
+        self.generated_c = []
+        self.generated_cpp = []
+
+        # key: generated file path. value: object file name, for the makefile
+        self.object_files = {}
+
         # list of (generated file path, include path) pairs
         self.deps = []
 
@@ -199,41 +309,73 @@ class CodeExtractorGroup(object):
         # value: (adoc file path, line number where a code snippet starts) pair
         self.origins = {}
 
+        # key: generated file path
+        # value: (object file name, compiler label, generated file name,
+        #         "adoc file path:line number") for the makefile ORIGIN lines
+        self.origin_entries = {}
+
     def process(self, files):
-        for fn in files:
-            extractor = CodeExtractor(output_line_numbers=self.output_line_numbers,
-                                      quiet=self.quiet)
-            extractor.process_file(fn)
-
-            if extractor.generated_files:
-                self.generated_files[extractor.filename] = extractor.generated_files
-                self.all_generated.extend(extractor.generated_files)
-                self.deps.extend(extractor.deps)
-                self.origins.update({fn: (extractor.filename, line_num)
-                                     for fn, line_num in extractor.origins.items()})
+        files = list(files)
+        worker_args = (self.output_line_numbers, self.quiet)
+        if len(files) > 1:
+            # Files are independent, so extract them in parallel.
+            # map() returns results in file order, keeping output stable.
+            with ProcessPoolExecutor(initializer=_init_worker,
+                                     initargs=worker_args) as executor:
+                self.add_results(executor.map(_extract_file, files))
+        else:
+            _init_worker(*worker_args)
+            self.add_results(map(_extract_file, files))
+
+    def add_results(self, results):
+        """Merge the per-file results returned by _extract_file."""
+        for filename, generated_files, deps, origins, output in results:
+            if output:
+                print(output, end='')
+
+            if generated_files:
+                self.generated_files[filename] = generated_files
+                self.all_generated.extend(generated_files)
+                for generated in generated_files:
+                    source = str(generated)
+                    root, ext = os.path.splitext(source)
+                    self.object_files[generated] = f'{root}.o'
+                    if ext == '.c':
+                        self.generated_c.append(source)
+                    elif ext == '.cpp':
+                        self.generated_cpp.append(source)
+                self.deps.extend(deps)
+                for fn, line_num in origins.items():
+                    self.origins[fn] = (filename, line_num)
+                    compiler = '[c++] ' if fn.suffix == '.cpp' else '[cc]  '
+                    self.origin_entries[fn] = (self.object_files[fn], compiler,
+                                               fn.name, f'{filename}:{line_num}')
 
     def output_makefile(self, makefile):
-        with open(makefile, 'w', encoding='utf-8') as f:
-
-            generated_c_string = ' \\\n'.join(str(fn)
-                                              for fn in self.all_generated if fn.suffix == '.c')
-            generated_cpp_string = ' \\\n'.join(str(fn)
-                                                for fn in self.all_generated if fn.suffix == '.cpp')
-            deps_string = '\n'.join(f"{fn.with_suffix('.o')}: {dep} $(CODEDIR)/common_include.h"
-                                    for fn, dep in self.deps)
-            extra_arg = ''
-            if self.output_line_numbers:
-                extra_arg = '--line_numbers'
-            f.write("""
+        buf = io.StringIO()
+
+        object_files = self.object_files
+        generated_c_string = ' \\\n'.join(self.generated_c)
+        generated_cpp_string = ' \\\n'.join(self.generated_cpp)
+        deps_string = '\n'.join(f"{object_files[fn]}: {dep} $(CODEDIR)/common_include.h"
+                                for fn, dep in self.deps)
+        extra_arg = ''
+        if self.output_line_numbers:
+            extra_arg = '--line_numbers'
+        out = (ROOT / 'specification' / 'generated' / 'out' / '1.1').relative_to(CWD)
+        codedir = CODEDIR.relative_to(CWD)
+        script = Path(__file__)
+        inputs = ' '.join(str(infile) for infile in self.generated_files)
+        buf.write(f"""
 OUTDIR  ?= $(CURDIR)/{out}
 CODEDIR ?= $(CURDIR)/{codedir}
 PYTHON   ?= python3
 QUIET    ?= @
 
-GENERATED_C := {c}
+GENERATED_C := {generated_c_string}
 C_OBJECTS := $(patsubst %.c,%.o,$(GENERATED_C))
 
-GENERATED_CPP := {cpp}
+GENERATED_CPP := {generated_cpp_string}
 CPP_OBJECTS := $(patsubst %.cpp,%.o,$(GENERATED_CPP))
 
 build-examples: $(C_OBJECTS) $(CPP_OBJECTS)
@@ -256,38 +398,25 @@ EXTRACT_QUIET := --quiet
 endif
 
 $(GENERATED_C) $(GENERATED_CPP) {makefile}: {script} {inputs}
-\t$(QUIET)$(PYTHON) $< {extra} --makefile={makefile} $(EXTRACT_QUIET)
+\t$(QUIET)$(PYTHON) $< {extra_arg} --makefile={makefile} $(EXTRACT_QUIET)
 
 gen: {script}
-\t$(QUIET)$(PYTHON) $< {extra} --makefile={makefile} $(EXTRACT_QUIET)
+\t$(QUIET)$(PYTHON) $< {extra_arg} --makefile={makefile} $(EXTRACT_QUIET)
 .PHONY: gen
 
-{deps}
-""".format(out=(ROOT / 'specification' / 'generated' / 'out' / '1.1').relative_to(Path('.').resolve()),
-                codedir=CODEDIR.relative_to(Path('.').resolve()),
-                c=generated_c_string,
-                cpp=generated_cpp_string,
-                makefile=makefile,
-                script=Path(__file__),
-                extra=extra_arg,
-                inputs=' '.join(str(infile)
-                                for infile in self.generated_files),
-                deps=deps_string))
-            for fn, gen in self.generated_files.items():
-                f.write('{stem}: {files}\n.PHONY: {stem}\n'.format(
-                    stem=fn.stem, files=' '.join(str(g.with_suffix('.o')) for g in gen)))
-            if self.origins:
-                width = max(len(generated.name) for generated in self.origins)
-
-                for generated, origin in self.origins.items():
-                    origin_file, origin_line = origin
-                    if generated.suffix == '.cpp':
-                        compiler = '[c++] '
-                    else:
-                        compiler = '[cc]  '
-                    origin_str = '{} {} extracted from {}:{}'.format(compiler, generated.name.ljust(width),
-                                                                     origin_file, origin_line)
-                    f.write(f"{generated.with_suffix('.o')}: ORIGIN := {origin_str}\n")
+{deps_string}
+""")
+        for fn, gen in self.generated_files.items():
+            objects = ' '.join([object_files[g] for g in gen])
+            buf.write(f'{fn.stem}: {objects}\n.PHONY: {fn.stem}\n')
+        if self.origin_entries:
+            entries = self.origin_entries.values()
+            width = max(len(name) for _, _, name, _ in entries)
+            buf.write(''.join([
+                f"{object_file}: ORIGIN := {compiler} {name.ljust(width)} extracted from {location}\n"
+                for object_file, compiler, name, location in entries]))
+
+        Path(makefile).write_text(buf.getvalue(), encoding='utf-8')
 
 
 if __name__ == "__main__":
@@ -317,7 +446,7 @@ if __name__ == "__main__":
     if args.file:
         files = [Path(f).resolve() for f in args.file]
     else:
-        files = ALL_DOCS
+        files = find_all_docs()
 
     extractors = CodeExtractorGroup(output_line_numbers=args.line_numbers,
                                     quiet=args.quiet)
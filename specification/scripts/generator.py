@@ -9,7 +9,6 @@ from __future__ import unicode_literals
 
 import io
 import os
-import pdb
 import re
 import shutil
 import sys
@@ -366,6 +365,7 @@ class OutputGenerator:
 
         if name in bad and True:
             print(f'breakName {name}: {msg}')
+            import pdb
             pdb.set_trace()
 
     def __init__(self, errFile=sys.stderr, warnFile=sys.stderr, diagFile=sys.stdout):
@@ -840,13 +840,13 @@ class OutputGenerator:
         """Create a directory, if not already done.
 
         Generally called from derived generators creating hierarchies."""
+        if path in self.madeDirs:
+            return
         self.logMsg('diag', f"OutputGenerator::makeDir({str(path)})")
-        if path not in self.madeDirs:
-            # This can get race conditions with multiple writers, see
-            # https://stackoverflow.com/questions/273192/
-            if not os.path.exists(path):
-                os.makedirs(path)
-            self.madeDirs[path] = None
+        # exist_ok avoids race conditions with multiple writers, see
+        # https://stackoverflow.com/questions/273192/
+        os.makedirs(path, exist_ok=True)
+        self.madeDirs[path] = None
 
     def beginFile(self, genOpts):
         """Start a new interface file
@@ -5,21 +5,24 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import argparse
+import contextlib
+import copy
+import io
+import multiprocessing
 import os
-import pdb
 import re
 import sys
 import time
+import traceback
 import xml.etree.ElementTree as etree
 
-sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+_scriptsDir = os.path.dirname(os.path.abspath(__file__))
+if _scriptsDir not in sys.path:
+    sys.path.append(_scriptsDir)
 
 from cgenerator import CGeneratorOptions, COutputGenerator
 from creflectiongenerator import CReflectionOutputGenerator
 from docgenerator import DocGeneratorOptions, DocOutputGenerator
-from interfacedocgenerator import InterfaceDocGenerator
-from extensionmetadocgenerator import (ExtensionMetaDocGeneratorOptions,
-                                       ExtensionMetaDocOutputGenerator)
 from generator import write
 from hostsyncgenerator import HostSynchronizationOutputGenerator
 from indexgenerator import DocIndexOutputGenerator
@@ -37,14 +40,14 @@ startTime = None
 def startTimer(timeit):
     global startTime
     if timeit:
-        startTime = time.process_time()
+        startTime = time.perf_counter_ns()
 
 
 def endTimer(timeit, msg):
     global startTime
     if timeit and startTime is not None:
-        endTime = time.process_time()
-        logDiag(msg, endTime - startTime)
+        endTime = time.perf_counter_ns()
+        logDiag(msg, f'{(endTime - startTime) / 1e9:.3f}s')
         startTime = None
 
 
@@ -52,15 +55,52 @@ def makeREstring(strings, default=None, strings_are_regex=False):
     """Turn a list of strings into a regexp string matching exactly those strings."""
     if strings or default is None:
         if not strings_are_regex:
-            strings = (re.escape(s) for s in strings)
+            strings = list(map(re.escape, strings))
         return f"^({'|'.join(strings)})$"
     return default
 
 
+# REUSE-IgnoreStart
+# Copyright text prefixing all headers (list of strings).
+prefixStrings = [
+    '/*',
+    '** Copyright 2017-2024, The Khronos Group Inc.',
+    '**',
+    # The following split string is to avoid confusing the "REUSE" tool
+    '** SPDX-License-Identifier' + ': Apache-2.0 OR MIT',
+    '*/',
+    ''
+]
+# REUSE-IgnoreEnd
+
+# Text specific to OpenXR headers
+xrPrefixStrings = [
+    '/*',
+    '** This header is generated from the Khronos OpenXR XML API Registry.',
+    '**',
+    '*/',
+    ''
+]
+
+# Include the non-platform openxr header in the platform header.
+platformPrefixStrings = [
+    '#include "openxr.h"'
+]
+
+# Complete prefixes for OpenXR headers and for headers that build on
+# openxr.h, shared by all targets using them.
+xrHeaderPrefixStrings = prefixStrings + xrPrefixStrings
+xrPlatformHeaderPrefixStrings = xrHeaderPrefixStrings + platformPrefixStrings
+
+# An API style conventions object
+conventions = APIConventions()
+
+
 def makeGenOpts(args):
-    """Returns a directory of [ generator function, generator options ] indexed
-    by specified short names. The generator options incorporate the following
-    parameters:
+    """Returns a directory of functions indexed by specified short names, each
+    returning [ generator function, generator options ] for its target, so
+    only the requested target's options are constructed. The generator
+    options incorporate the following parameters:
 
     args is an parsed argument object; see below for the fields that are used."""
     global genOpts
@@ -106,43 +146,13 @@ def makeGenOpts(args):
     emitExtensionsPat    = makeREstring(emitExtensions, allExtensions)
     featuresPat          = makeREstring(features, allFeatures)
 
-    # REUSE-IgnoreStart
-    # Copyright text prefixing all headers (list of strings).
-    prefixStrings = [
-        '/*',
-        '** Copyright 2017-2024, The Khronos Group Inc.',
-        '**',
-        # The following split string is to avoid confusing the "REUSE" tool
-        '** SPDX-License-Identifier' + ': Apache-2.0 OR MIT',
-        '*/',
-        ''
-    ]
-    # REUSE-IgnoreEnd
-
-    # Text specific to OpenXR headers
-    xrPrefixStrings = [
-        '/*',
-        '** This header is generated from the Khronos OpenXR XML API Registry.',
-        '**',
-        '*/',
-        ''
-    ]
-
-    # Include the non-platform openxr header in the platform header.
-    platformPrefixStrings = [
-        '#include "openxr.h"'
-    ]
-
     # Defaults for generating re-inclusion protection wrappers (or not)
     protectFile = protect
 
-    # An API style conventions object
-    conventions = APIConventions()
-
     # OpenXR 1.0 - header for core API + extensions.
     # To generate just the core API,
     # change to 'defaultExtensions = None' below.
-    genOpts['openxr.h'] = [
+    genOpts['openxr.h'] = lambda: [
           COutputGenerator,
           CGeneratorOptions(
             conventions       = conventions,
@@ -156,7 +166,7 @@ def makeGenOpts(args):
             addExtensions     = None,
             removeExtensions  = None,
             emitExtensions    = emitExtensionsPat,
-            prefixText        = prefixStrings + xrPrefixStrings,
+            prefixText        = xrHeaderPrefixStrings,
             genFuncPointers   = True,
             protectFile       = protectFile,
             protectFeature    = False,
@@ -173,14 +183,14 @@ def makeGenOpts(args):
             aliasMacro        = 'XR_MAY_ALIAS')
         ]
 
-    standalonePrefixString = prefixStrings + xrPrefixStrings
+    standalonePrefixString = xrHeaderPrefixStrings
     if len(standalonePrefixOverride) > 0:
         standalonePrefixString = standalonePrefixOverride
 
     # "XR_EXT_some_extension" becomes "ext_some_extension.h"
     standaloneExtensionFileName = f"{standaloneExtension[len('XR_'):].lower()}.h"
 
-    genOpts['standalone_header'] = [
+    genOpts['standalone_header'] = lambda: [
           COutputGenerator,
           CGeneratorOptions(
             conventions       = conventions,
@@ -226,7 +236,7 @@ def makeGenOpts(args):
 
 
     # OpenXR platform header for Graphics API and Platform extensions.
-    genOpts['openxr_platform.h'] = [
+    genOpts['openxr_platform.h'] = lambda: [
           COutputGenerator,
           CGeneratorOptions(
             conventions       = conventions,
@@ -240,7 +250,7 @@ def makeGenOpts(args):
             addExtensions     = None,
             removeExtensions  = None,
             emitExtensions    = emitExtensionsPat,
-            prefixText        = prefixStrings + xrPrefixStrings + platformPrefixStrings,
+            prefixText        = xrPlatformHeaderPrefixStrings,
             genFuncPointers   = True,
             protectFile       = protectFile,
             protectFeature    = False,
@@ -257,7 +267,7 @@ def makeGenOpts(args):
             aliasMacro        = 'XR_MAY_ALIAS')
     ]
 
-    genOpts['openxr_loader_negotiation.h'] = [
+    genOpts['openxr_loader_negotiation.h'] = lambda: [
           COutputGenerator,
           CGeneratorOptions(
             conventions       = conventions,
@@ -271,7 +281,7 @@ def makeGenOpts(args):
             addExtensions     = None,
             removeExtensions  = None,
             emitExtensions    = emitExtensionsPat,
-            prefixText        = prefixStrings + xrPrefixStrings + platformPrefixStrings,
+            prefixText        = xrPlatformHeaderPrefixStrings,
             genFuncPointers   = True,
             protectFile       = protectFile,
             protectFeature    = False,
@@ -301,7 +311,7 @@ def makeGenOpts(args):
             addExtensions=None,
             removeExtensions=None,
             emitExtensions=emitExtensionsPat,
-            prefixText=prefixStrings + xrPrefixStrings + platformPrefixStrings,
+            prefixText=xrPlatformHeaderPrefixStrings,
             genFuncPointers=True,
             protectFile=protectFile,
             protectFeature=False,
@@ -316,17 +326,17 @@ def makeGenOpts(args):
             aliasMacro='XR_MAY_ALIAS')
 
     # OpenXR generic reflection header
-    genOpts['openxr_reflection.h'] = [
+    genOpts['openxr_reflection.h'] = lambda: [
         CReflectionOutputGenerator,
         make_reflection_options('openxr_reflection.h'),
     ]
 
-    genOpts['openxr_reflection_structs.h'] = [
+    genOpts['openxr_reflection_structs.h'] = lambda: [
         CReflectionOutputGenerator,
         make_reflection_options('openxr_reflection_structs.h'),
     ]
 
-    genOpts['openxr_reflection_parent_structs.h'] = [
+    genOpts['openxr_reflection_parent_structs.h'] = lambda: [
         CReflectionOutputGenerator,
         make_reflection_options('openxr_reflection_parent_structs.h'),
     ]
@@ -338,7 +348,7 @@ def makeGenOpts(args):
     # Because the 1.1 main branch includes ref pages for extensions,
     # all the extension interfaces need to be generated, even though
     # none are used by the core spec itself.
-    genOpts['apiinc'] = [
+    genOpts['apiinc'] = lambda: [
           DocOutputGenerator,
           DocGeneratorOptions(
             conventions       = conventions,
@@ -353,7 +363,7 @@ def makeGenOpts(args):
             addExtensions     = addExtensionsPat,
             removeExtensions  = removeExtensionsPat,
             emitExtensions    = emitExtensionsPat,
-            prefixText        = prefixStrings + xrPrefixStrings,
+            prefixText        = xrHeaderPrefixStrings,
             apicall           = '',
             apientry          = '',
             apientryp         = '*',
@@ -365,7 +375,7 @@ def makeGenOpts(args):
 
     # Python and Ruby representations of API information, used by scripts
     # that do not need to load the full XML.
-    genOpts['apimap.py'] = [
+    genOpts['apimap.py'] = lambda: [
           PyOutputGenerator,
           DocGeneratorOptions(
             conventions       = conventions,
@@ -383,7 +393,7 @@ def makeGenOpts(args):
 
     # Python and Ruby representations of API information, used by scripts
     # that do not need to load the full XML.
-    genOpts['apimap.rb'] = [
+    genOpts['apimap.rb'] = lambda: [
           RubyOutputGenerator,
           DocGeneratorOptions(
             conventions       = conventions,
@@ -400,7 +410,7 @@ def makeGenOpts(args):
         ]
 
     # Index chapter
-    genOpts['index.adoc'] = [
+    genOpts['index.adoc'] = lambda: [
           DocIndexOutputGenerator,
           DocGeneratorOptions(
             conventions       = conventions,
@@ -417,7 +427,7 @@ def makeGenOpts(args):
         ]
 
     # Core API validity files for spec
-    genOpts['validinc'] = [
+    genOpts['validinc'] = lambda: [
           ValidityOutputGenerator,
           DocGeneratorOptions(
             conventions       = conventions,
@@ -434,7 +444,7 @@ def makeGenOpts(args):
         ]
 
     # Core API host sync table files for spec
-    genOpts['hostsyncinc'] = [
+    genOpts['hostsyncinc'] = lambda: [
           HostSynchronizationOutputGenerator,
           DocGeneratorOptions(
             conventions       = conventions,
@@ -451,7 +461,12 @@ def makeGenOpts(args):
         ]
 
     # Extension metainformation for spec extension appendices
-    genOpts['extinc'] = [
+    # This and interfaceinc import their generators only when selected, as
+    # they pull in pyparsing through parse_dependency.
+    def makeExtinc():
+        from extensionmetadocgenerator import (ExtensionMetaDocGeneratorOptions,
+                                               ExtensionMetaDocOutputGenerator)
+        return [
           ExtensionMetaDocOutputGenerator,
           ExtensionMetaDocGeneratorOptions(
             conventions       = conventions,
@@ -466,9 +481,13 @@ def makeGenOpts(args):
             removeExtensions  = None,
             emitExtensions    = emitExtensionsPat)
         ]
+    genOpts['extinc'] = makeExtinc
+
     # Version and extension interface docs for version/extension appendices
     # Includes all extensions by default.
-    genOpts['interfaceinc'] = [
+    def makeInterfaceinc():
+        from interfacedocgenerator import InterfaceDocGenerator
+        return [
         InterfaceDocGenerator,
         DocGeneratorOptions(
             conventions       = conventions,
@@ -485,6 +504,20 @@ def makeGenOpts(args):
             emitExtensions    = emitExtensionsPat,
             reparentEnums     = False)
         ]
+    genOpts['interfaceinc'] = makeInterfaceinc
+
+
+def buildGenOpt(target, args):
+    """Returns [ generator function, generator options ] for the single
+    target short name, or None if there is no such target.
+
+    args is an parsed argument object as for makeGenOpts."""
+    makeGenOpts(args)
+    makeTarget = genOpts.get(target)
+    if makeTarget is None:
+        return None
+    return makeTarget()
+
 
 def genTarget(args):
     """Create an API generator and corresponding generator options based on
@@ -499,22 +532,22 @@ def genTarget(args):
     - protect - True if re-inclusion wrappers should be created
     - extensions - list of additional extensions to include in generated interfaces"""
 
-    # Create generator options with specified parameters
-    makeGenOpts(args)
+    # Create generator options for the requested target
+    genOpt = buildGenOpt(args.target, args)
 
     # Select a generator matching the requested target
-    if args.target in genOpts:
-        createGenerator = genOpts[args.target][0]
-        options = genOpts[args.target][1]
+    if genOpt is not None:
+        createGenerator, options = genOpt
 
         if not args.quiet:
-            write('* Building', options.filename, file=sys.stderr)
-            write('* options.versions          =', options.versions, file=sys.stderr)
-            write('* options.emitversions      =', options.emitversions, file=sys.stderr)
-            write('* options.defaultExtensions =', options.defaultExtensions, file=sys.stderr)
-            write('* options.addExtensions     =', options.addExtensions, file=sys.stderr)
-            write('* options.removeExtensions  =', options.removeExtensions, file=sys.stderr)
-            write('* options.emitExtensions    =', options.emitExtensions, file=sys.stderr)
+            sys.stderr.write(
+                f'* Building {options.filename}\n'
+                f'* options.versions          = {options.versions}\n'
+                f'* options.emitversions      = {options.emitversions}\n'
+                f'* options.defaultExtensions = {options.defaultExtensions}\n'
+                f'* options.addExtensions     = {options.addExtensions}\n'
+                f'* options.removeExtensions  = {options.removeExtensions}\n'
+                f'* options.emitExtensions    = {options.emitExtensions}\n')
 
 
 
@@ -529,6 +562,96 @@ def genTarget(args):
         return None
 
 
+def parseRegistry(args):
+    """Parse the registry XML specified by args.registry into an ElementTree
+    object."""
+    startTimer(args.time)
+    tree = etree.parse(args.registry)
+    endTimer(args.time, '* Time to make ElementTree =')
+    return tree
+
+
+def genRegistry(args, tree):
+    """Generate args.target from a parsed registry tree.
+
+    Loading the tree into a Registry modifies it, so each target must be
+    given its own tree."""
+
+    # Create the API generator & generator options
+    (gen, options) = genTarget(args)
+
+    # Create the registry object with the specified generator and generator
+    # options. The options are set before XML loading as they may affect it.
+    reg = Registry(gen, options)
+
+    # Load the XML tree into the registry object
+    startTimer(args.time)
+    reg.loadElementTree(tree)
+    endTimer(args.time, '* Time to parse ElementTree =')
+
+    if args.dump:
+        write('* Dumping registry to regdump.txt', file=sys.stderr)
+        with open('regdump.txt', 'w', encoding='utf-8', buffering=1 << 20) as fh:
+            reg.dumpReg(filehandle=fh)
+
+    # Finally, use the output generator to create the requested target
+    if args.debug:
+        import pdb
+        pdb.run('reg.apiGen()', globals(), locals())
+    else:
+        startTimer(args.time)
+        reg.apiGen()
+        endTimer(args.time, f"* Time to generate {options.filename} =")
+
+    if not args.quiet:
+        logDiag('* Generated', options.filename)
+
+
+# The arguments and registry tree given to each forked worker process
+_workerArgs = None
+_workerTree = None
+
+
+def initTargetWorker(args, tree):
+    """Initialize a forked worker process with the parsed arguments and its
+    inherited copy of the registry tree parsed by the parent."""
+    global _workerArgs, _workerTree
+    _workerArgs = args
+    _workerTree = tree
+
+
+def genTargetWorker(target):
+    """Generate a single target in a forked worker process, using the
+    process's copy of the registry tree.
+
+    All output is collected rather than written to the streams and files
+    shared with other workers. Returns a tuple of the standard output
+    text, the standard error text, the error and warning text (if written
+    to a file), the diagnostic text, and the traceback text if generation
+    failed (else None), for the parent to write out in target order."""
+    global errWarn, diag
+    args = copy.copy(_workerArgs)
+    args.target = target
+    errToStderr = errWarn is sys.stderr
+    with contextlib.redirect_stdout(io.StringIO()) as out, \
+         contextlib.redirect_stderr(io.StringIO()) as err:
+        # Log to the captured output, as the parent logs to sys.stdout
+        setLogFile(setDiag = args.time, setWarn = True, filename = '-')
+        errWarn = err if errToStderr else io.StringIO()
+        if diag is not None:
+            diag = io.StringIO()
+        try:
+            genRegistry(args, _workerTree)
+            failure = None
+        except Exception:
+            failure = traceback.format_exc()
+    return (out.getvalue(),
+            err.getvalue(),
+            '' if errToStderr else errWarn.getvalue(),
+            diag.getvalue() if diag is not None else '',
+            failure)
+
+
 # -feature name
 # -extension name
 # For both, "name" may be a single name, or a space-separated list
@@ -571,7 +694,7 @@ if __name__ == '__main__':
     parser.add_argument('-noprotect', dest='protect', action='store_false',
                         help='Disable inclusion protection in output headers')
     parser.add_argument('-profile', action='store_true',
-                        help='Enable profiling')
+                        help='Profile generation and report the slowest calls to stderr')
     parser.add_argument('-registry', action='store',
                         default='xr.xml',
                         help='Use specified registry file instead of xr.xml')
@@ -582,8 +705,8 @@ if __name__ == '__main__':
     parser.add_argument('-o', action='store', dest='directory',
                         default='.',
                         help='Create target and related files in specified directory')
-    parser.add_argument('target', metavar='target', nargs='?',
-                        help='Specify target')
+    parser.add_argument('targets', metavar='target', nargs='+',
+                        help='Specify target. Several independent targets may be given, and are generated in parallel where possible')
     parser.add_argument('-quiet', action='store_true', default=False,
                         help='Suppress script output during normal execution.')
     parser.add_argument('-verbose', action='store_false', dest='quiet', default=True,
@@ -595,49 +718,66 @@ if __name__ == '__main__':
     args.feature = [name for arg in args.feature for name in arg.split()]
     args.extension = [name for arg in args.extension for name in arg.split()]
 
-    # create error/warning & diagnostic files
-    if args.errfile:
-        errWarn = open(args.errfile, 'w', encoding='utf-8')
-    else:
-        errWarn = sys.stderr
-
-    if args.diagfile:
-        diag = open(args.diagfile, 'w', encoding='utf-8')
-    else:
-        diag = None
-
-    if args.time:
-        # Log diagnostics and warnings
-        setLogFile(setDiag = True, setWarn = True, filename = '-')
-
-    # Create the API generator & generator options
-    (gen, options) = genTarget(args)
-
-    # Create the registry object with the specified generator and generator
-    # options. The options are set before XML loading as they may affect it.
-    reg = Registry(gen, options)
-
-    # Parse the specified registry XML into an ElementTree object
-    startTimer(args.time)
-    tree = etree.parse(args.registry)
-    endTimer(args.time, '* Time to make ElementTree =')
-
-    # Load the XML tree into the registry object
-    startTimer(args.time)
-    reg.loadElementTree(tree)
-    endTimer(args.time, '* Time to parse ElementTree =')
-
-    if args.dump:
-        write('* Dumping registry to regdump.txt', file=sys.stderr)
-        reg.dumpReg(filehandle=open('regdump.txt', 'w', encoding='utf-8'))
-
-    # Finally, use the output generator to create the requested target
-    if args.debug:
-        pdb.run('reg.apiGen()')
-    else:
-        startTimer(args.time)
-        reg.apiGen()
-        endTimer(args.time, f"* Time to generate {options.filename} =")
-
-    if not args.quiet:
-        logDiag('* Generated', options.filename)
+    with contextlib.ExitStack() as stack:
+        # create error/warning & diagnostic files, closed when generation ends
+        if args.errfile:
+            errWarn = stack.enter_context(
+                open(args.errfile, 'w', encoding='utf-8', buffering=1 << 16))
+        else:
+            errWarn = sys.stderr
+
+        if args.diagfile:
+            diag = stack.enter_context(
+                open(args.diagfile, 'w', encoding='utf-8', buffering=1 << 16))
+        else:
+            diag = None
+
+        if args.time:
+            # Log diagnostics and warnings
+            setLogFile(setDiag = True, setWarn = True, filename = '-')
+
+        if args.profile:
+            import cProfile
+            import pstats
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        # Generate several targets in forked worker processes, each of which
+        # inherits a copy of the registry tree parsed once here. Otherwise,
+        # generate each target in turn from a freshly parsed tree.
+        if (len(args.targets) > 1 and not (args.debug or args.dump or args.profile)
+                and 'fork' in multiprocessing.get_all_start_methods()):
+            tree = parseRegistry(args)
+            # Flush pending output so that workers do not repeat it
+            for f in (errWarn, diag, sys.stdout, sys.stderr):
+                if f is not None:
+                    f.flush()
+            # Each worker handles a single target, since generating one
+            # modifies the worker's copy of the tree.
+            processes = min(len(args.targets), os.cpu_count() or 1)
+            failed = False
+            with multiprocessing.get_context('fork').Pool(
+                    processes, initializer=initTargetWorker,
+                    initargs=(args, tree), maxtasksperchild=1) as pool:
+                for outText, errOutText, errText, diagText, failure in pool.imap(
+                        genTargetWorker, args.targets):
+                    sys.stdout.write(outText)
+                    sys.stderr.write(errOutText)
+                    errWarn.write(errText)
+                    if diag is not None:
+                        diag.write(diagText)
+                    if failure is not None:
+                        sys.stderr.write(failure)
+                        failed = True
+            if failed:
+                sys.exit(1)
+        else:
+            for target in args.targets:
+                targetArgs = copy.copy(args)
+                targetArgs.target = target
+                genRegistry(targetArgs, parseRegistry(targetArgs))
+
+        if args.profile:
+            profiler.disable()
+            stats = pstats.Stats(profiler, stream=sys.stderr)
+            stats.strip_dirs().sort_stats('cumulative').print_stats(30)
@@ -164,3 +164,21 @@ class JinjaTemplate:
                 "Jinja2 template syntax error during render: {}:{} error: {}".
                 format(e.filename, e.lineno, e.message))
             raise e
+
+    def stream(self, *args, **kwargs):
+        """Render the Jinja2 template with the provided context, incrementally.
+
+        Returns a Jinja2 TemplateStream: call its dump method with a file object to write
+        the output piece by piece instead of building the whole result in memory first.
+        Syntax errors are handled as in render().
+        """
+        _add_to_path()
+        from jinja2 import TemplateSyntaxError
+
+        try:
+            return self.template.stream(*args, **kwargs)
+        except TemplateSyntaxError as e:
+            print(
+                "Jinja2 template syntax error during render: {}:{} error: {}".
+                format(e.filename, e.lineno, e.message))
+            raise e
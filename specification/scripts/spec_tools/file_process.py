@@ -79,12 +79,18 @@ class LinewiseFileProcessor:
 
     def get_preceding_lines(self, num):
         """Get *up to* the preceding num lines. Fewer may be returned if the requested number aren't available."""
-        return self._lines[- (num + 1):-1]
+        return self._lines[max(self.line_number - num - 1, 0):max(self.line_number - 1, 0)]
 
     def process_line(self, line_num, line):
         """Implement in your subclass to handle each new line."""
         raise NotImplementedError
 
+    def process_matched_line(self, line_num, line):
+        """Called by process_file_matches for each line where its pattern matched.
+
+        By default, handled like any other line."""
+        self.process_line(line_num, line)
+
     def _process_file_handle(self, file_handle):
         # These are so we can process one line earlier than we're actually iterating thru.
         processing_line_num = None
@@ -119,3 +125,40 @@ class LinewiseFileProcessor:
         else:
             with self._filename.open('r', encoding='utf-8') as f:
                 self._process_file_handle(f)
+
+    def process_file_matches(self, filename, pattern):
+        """Alternate entry point - call with a filename and a compiled regex to
+        visit only the lines where pattern matches, through process_matched_line.
+
+        The whole file is read, and pattern is searched over its full text, so it
+        should normally use re.MULTILINE and be anchored with '^'. The current and
+        next line, the line number and the preceding lines are all available to
+        process_matched_line, as they would be from process_file."""
+        if isinstance(filename, str):
+            filename = Path(filename).resolve()
+
+        self._filename = filename
+
+        with self._filename.open('r', encoding='utf-8') as f:
+            self._lines = f.readlines()
+        text = ''.join(self._lines)
+
+        line_num = 1
+        pos = 0
+        visited_line_num = None
+        for match in pattern.finditer(text):
+            start = match.start()
+            line_num += text.count('\n', pos, start)
+            pos = start
+            if line_num == visited_line_num:
+                # Already visited this line for an earlier match.
+                continue
+            visited_line_num = line_num
+
+            self._line_num = line_num
+            self._line = self._lines[line_num - 1]
+            if line_num < len(self._lines):
+                self._next_line = self._lines[line_num]
+            else:
+                self._next_line = None
+            self.process_matched_line(line_num, self._line)
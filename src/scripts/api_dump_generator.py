@@ -25,6 +25,8 @@
 #               generated source code for the API Dump layer.
 
 import dataclasses
+from itertools import chain, groupby
+from operator import itemgetter
 
 from automatic_source_generator import (AutomaticSourceOutputGenerator, CurrentExtensionTracker,
                                         undecorate)
@@ -96,17 +98,17 @@ class ApiDumpOutputGenerator(AutomaticSourceOutputGenerator):
     # and then call down to the base class to wrap everything up.
     #   self            the ApiDumpOutputGenerator object
     def endFile(self):
-        file_data = ''
+        file_data = []
         if self.genOpts.filename == 'xr_generated_api_dump.hpp':
-            file_data += self.outputLayerHeaderPrototypes()
-            file_data += self.outputApiDumpExterns()
+            file_data.append(self.outputLayerHeaderPrototypes())
+            file_data.append(self.outputApiDumpExterns())
 
         elif self.genOpts.filename == 'xr_generated_api_dump.cpp':
-            file_data += self.outputApiDumpMapMutexItems()
-            file_data += self.writeApiDumpUnionStructFuncs()
-            file_data += self.outputLayerCommands()
+            file_data.append(self.outputApiDumpMapMutexItems())
+            file_data.append(self.writeApiDumpUnionStructFuncs())
+            file_data.append(self.outputLayerCommands())
 
-        write(file_data, file=self.outFile)
+        write(''.join(file_data), file=self.outFile)
 
         # Finish processing in superclass
         AutomaticSourceOutputGenerator.endFile(self)
@@ -1191,44 +1193,50 @@ class ApiDumpOutputGenerator(AutomaticSourceOutputGenerator):
                 if cur_cmd.protect_value:
                     generated_commands += f'#endif // {cur_cmd.protect_string}\n'
 
-        generated_commands += 'PFN_xrVoidFunction ApiDumpLayerInnerGetInstanceProcAddr(\n'
-        generated_commands += '    const char*                                 name) {\n'
-        generated_commands += '        std::string func_name = name;\n\n'
+        generated_commands += self.outputLayerInnerGetInstanceProcAddr()
 
-        # reset the state
-        cur_extension = CurrentExtensionTracker(self.conventions.api_version_prefix)
+        return generated_commands
 
-        for x in range(0, 2):
-            if x == 0:
-                commands = self.core_commands
-            else:
-                commands = self.ext_commands
+    # Write the C++ inner xrGetInstanceProcAddr lookup for every command the layer exposes
+    #   self            the ApiDumpOutputGenerator object
+    def outputLayerInnerGetInstanceProcAddr(self):
+        parts = [
+            'PFN_xrVoidFunction ApiDumpLayerInnerGetInstanceProcAddr(\n',
+            '    const char*                                 name) {\n',
+            '        // Built once on first use, so each lookup is a single hash probe\n',
+            '        static const std::unordered_map<std::string, PFN_xrVoidFunction> layer_functions = {\n',
+        ]
 
-            for cur_cmd in commands:
-                assert cur_cmd.ext_name
-                generated_commands += cur_extension.format_if_extension_changed(cur_cmd.ext_name, "\n        // ---- {} commands\n")
+        cur_extension = CurrentExtensionTracker(self.conventions.api_version_prefix)
 
-                if cur_cmd.name in self.no_trampoline_or_terminator:
-                    continue
+        # Pull out just the fields needed here, so the loop below works on plain tuples
+        entries = [(cmd.ext_name, cmd.name, cmd.protect_value, cmd.protect_string)
+                   for cmd in chain(self.core_commands, self.ext_commands)]
+        for ext_name, group in groupby(entries, key=itemgetter(0)):
+            assert ext_name
+            parts.append(cur_extension.format_if_extension_changed(ext_name, "\n        // ---- {} commands\n"))
 
-                has_return = False
-                if cur_cmd.return_type is not None:
-                    has_return = True
+            for _, cmd_name, protect_value, protect_string in group:
+                if cmd_name in self.no_trampoline_or_terminator:
+                    continue
 
                 # Replace 'xr' in proto name with an API Dump-specific name to avoid collisions.s
-                layer_command_name = cur_cmd.name.replace(
+                layer_command_name = cmd_name.replace(
                     "xr", "ApiDumpLayerXr")
 
-                if cur_cmd.protect_value:
-                    generated_commands += f'#if {cur_cmd.protect_string}\n'
+                if protect_value:
+                    parts.append(f'#if {protect_string}\n')
 
-                generated_commands += '        if (func_name == "%s") {\n' % cur_cmd.name
-                generated_commands += f'            return reinterpret_cast<PFN_xrVoidFunction>({layer_command_name});\n'
-                generated_commands += '        }\n'
-                if cur_cmd.protect_value:
-                    generated_commands += f'#endif // {cur_cmd.protect_string}\n'
+                parts.append(f'            {{"{cmd_name}", reinterpret_cast<PFN_xrVoidFunction>({layer_command_name})}},\n')
+                if protect_value:
+                    parts.append(f'#endif // {protect_string}\n')
 
-        generated_commands += '        return nullptr;\n'
-        generated_commands += '    }\n'
+        parts.append('        };\n\n')
+        parts.append('        auto entry = layer_functions.find(name);\n')
+        parts.append('        if (entry == layer_functions.end()) {\n')
+        parts.append('            return nullptr;\n')
+        parts.append('        }\n')
+        parts.append('        return entry->second;\n')
+        parts.append('    }\n')
 
-        return generated_commands
+        return ''.join(parts)
@@ -21,6 +21,7 @@
 # Author: Mark Young <marky@lunarg.com>
 
 
+from itertools import chain
 import re
 
 from automatic_source_generator import (AutomaticSourceOutputGenerator, CurrentExtensionTracker,
@@ -2698,28 +2699,20 @@ class ValidationSourceOutputGenerator(AutomaticSourceOutputGenerator):
 
         validation_source_funcs += 'static PFN_xrVoidFunction GenValidUsageInnerGetInstanceProcAddr(\n'
         validation_source_funcs += '    const char*                                 name) {\n'
-        validation_source_funcs += '        std::string func_name = name;\n\n'
 
-        cur_extension = CurrentExtensionTracker(self.conventions.api_version_prefix)
-
-        for x in range(0, 2):
-            if x == 0:
-                commands = self.core_commands
-            else:
-                commands = self.ext_commands
+        # The name lengths are known here, so bucket the commands by them and have the
+        # generated lookup only compare against names of the requested length.
+        commands_by_name_length = {}
+        for cur_cmd in chain(self.core_commands, self.ext_commands):
+            assert cur_cmd.ext_name
+            if cur_cmd.name in self.no_trampoline_or_terminator:
+                continue
+            commands_by_name_length.setdefault(len(cur_cmd.name), []).append(cur_cmd)
 
+        validation_source_funcs += '        switch (std::strlen(name)) {\n'
+        for name_length, commands in sorted(commands_by_name_length.items()):
+            validation_source_funcs += f'        case {name_length}:\n'
             for cur_cmd in commands:
-                assert cur_cmd.ext_name
-                validation_source_funcs += cur_extension.format_if_extension_changed(cur_cmd.ext_name,
-                                                                                     "\n        // ---- {} commands\n")
-
-                if cur_cmd.name in self.no_trampoline_or_terminator:
-                    continue
-
-                has_return = False
-                if cur_cmd.return_type is not None:
-                    has_return = True
-
                 if cur_cmd.name in VALID_USAGE_MANUALLY_DEFINED:
                     # Remove 'xr' from proto name and use manual name
                     layer_command_name = cur_cmd.name.replace(
@@ -2732,11 +2725,15 @@ class ValidationSourceOutputGenerator(AutomaticSourceOutputGenerator):
                 if cur_cmd.protect_value:
                     validation_source_funcs += f'#if {cur_cmd.protect_string}\n'
 
-                validation_source_funcs += '        if (func_name == "%s") {\n' % cur_cmd.name
-                validation_source_funcs += f'            return reinterpret_cast<PFN_xrVoidFunction>({layer_command_name});\n'
-                validation_source_funcs += '        }\n'
+                validation_source_funcs += f'            if (0 == std::strcmp(name, "{cur_cmd.name}")) {{\n'
+                validation_source_funcs += f'                return reinterpret_cast<PFN_xrVoidFunction>({layer_command_name});\n'
+                validation_source_funcs += '            }\n'
                 if cur_cmd.protect_value:
                     validation_source_funcs += f'#endif // {cur_cmd.protect_string}\n'
+            validation_source_funcs += '            break;\n'
+        validation_source_funcs += '        default:\n'
+        validation_source_funcs += '            break;\n'
+        validation_source_funcs += '        }\n\n'
 
         # If we fell thru, return null
         validation_source_funcs += '        return nullptr;\n'
@@ -2748,7 +2745,6 @@ class ValidationSourceOutputGenerator(AutomaticSourceOutputGenerator):
         validation_source_funcs += '    const char*         name,\n'
         validation_source_funcs += '    PFN_xrVoidFunction* function) {\n'
         validation_source_funcs += '    try {\n'
-        validation_source_funcs += '        std::string func_name = name;\n'
         validation_source_funcs += '        std::vector<GenValidUsageXrObjectInfo> objects;\n'
         validation_source_funcs += '        if (g_instance_info.verifyHandle(&instance) == VALIDATE_XR_HANDLE_INVALID) {\n'
         validation_source_funcs += '            // Make sure the instance is valid if it is not XR_NULL_HANDLE\n'